@@ -18,31 +18,147 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from xml.etree.ElementTree import (ElementTree, Element)
+from xml.etree.ElementTree import (Element, ParseError, parse)
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
 import zipfile
 import logging
 import io
-from typing import (Any, Callable, Dict, List, IO, Iterator, Optional, Tuple, TypeVar, Union)
+import os
+import sys
+import threading
+from typing import (Any, Callable, Dict, Iterable, List, IO, Iterator, Optional, Tuple, Type, Union)
+from intervaltree import IntervalTree
 
 from .flash_algo import PackFlashAlgo
 from ...core import exceptions
 from ...core.target import Target
 from ...core.memory_map import (MemoryMap, MemoryRegion, MemoryType, MEMORY_TYPE_CLASS_MAP, FlashRegion, RamRegion)
 
+## Exceptions raised by the XML parsers for a malformed PDSC.
+_XML_PARSE_ERRORS: Tuple[Type[Exception], ...] = (ParseError,)
+
+try:
+    from lxml import etree as lxml_etree
+    LXML_AVAILABLE = True
+    _XML_PARSE_ERRORS += (lxml_etree.XMLSyntaxError,)
+except ImportError:
+    LXML_AVAILABLE = False
+
 LOG = logging.getLogger(__name__)
 
+## Maximum number of files whose contents are kept by CmsisPack.get_file(). Devices in a pack
+# generally share a handful of FLMs, so a small cache avoids most repeated reads.
+_FILE_CACHE_SIZE = 8
+
+## Maximum total size in bytes of the file contents kept by CmsisPack.get_file(). FLMs are
+# usually tens of KB. Larger files are not cached.
+_FILE_CACHE_MAX_BYTES = 512 * 1024
+
+## Extensions of files that CmsisPack.get_file() never caches. SVDs are often several MB and are
+# normally read only once.
+_FILE_CACHE_EXCLUDED_EXTENSIONS = ('.svd',)
+
+## Whether PDSC files are parsed with lxml instead of the stdlib ElementTree. lxml is much faster
+# for large DFPs, so it is used if available. May be set to False to force use of ElementTree.
+_USE_LXML = LXML_AVAILABLE
+
 class MalformedCmsisPackError(exceptions.TargetSupportError):
     """@brief Exception raised for errors parsing a CMSIS-Pack."""
     pass
 
 class _DeviceInfo:
     """@brief Simple container class to hold XML elements describing a device."""
-    def __init__(self, element: Element, **kwargs):
+    __slots__ = ('element', 'families', 'memories', 'algos', 'debugs')
+
+    def __init__(self,
+            element: Element,
+            families: Optional[List[str]] = None,
+            memories: Optional[List[Element]] = None,
+            algos: Optional[List[Element]] = None,
+            debugs: Optional[List[Element]] = None,
+            ) -> None:
         self.element: Element = element
-        self.families: List[str] = kwargs.get('families', [])
-        self.memories: List[Element] = kwargs.get('memories', [])
-        self.algos: List[Element] = kwargs.get('algos', [])
-        self.debugs: List[Element] = kwargs.get('debugs', [])
+        self.families: List[str] = families if families is not None else []
+        self.memories: List[Element] = memories if memories is not None else []
+        self.algos: List[Element] = algos if algos is not None else []
+        self.debugs: List[Element] = debugs if debugs is not None else []
+
+@lru_cache(maxsize=4096)
+def _parse_addr(value: str) -> int:
+    """@brief Convert an address or size attribute value to an integer.
+
+    Results are cached because the same literals are repeated many times throughout a PDSC. Hex
+    values, by far the most common, are converted directly rather than through int()'s base
+    auto-detection.
+
+    @exception ValueError The value is not a valid integer literal.
+    """
+    if value[:2] in ('0x', '0X'):
+        return int(value, 16)
+    return int(value, base=0)
+
+class _MemoryItemMap(dict):
+    """@brief Item map used to filter memory elements.
+
+    Values are (start, size, element) tuples keyed by the memory's identifier. A list of the
+    address ranges of the memories in the map, sorted by start address, is kept alongside so
+    overlap checks can skip all memories that start above the range being checked, and never
+    have to re-parse the addresses of memories already in the map.
+    """
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._starts: List[int] = []
+        self._ranges: List[Tuple[int, int, Any]] = []
+
+    def copy(self) -> "_MemoryItemMap":
+        result = _MemoryItemMap(self)
+        result._starts = self._starts.copy()
+        result._ranges = self._ranges.copy()
+        return result
+
+    def add(self, key: Any, start: int, size: int, elem: Element) -> None:
+        """@brief Add a memory element, replacing any existing memory with the same key."""
+        self.remove(key)
+        self[key] = (start, size, elem)
+        i = bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        # Memories are treated as covering start up to, but not including, their last address.
+        self._ranges.insert(i, (start, start + size - 1, key))
+
+    def remove(self, key: Any) -> None:
+        """@brief Remove the memory with the given key, if present."""
+        if key in self:
+            start, _, _ = self.pop(key)
+            i = bisect_right(self._starts, start) - 1
+            while self._ranges[i][2] != key:
+                i -= 1
+            del self._starts[i]
+            del self._ranges[i]
+
+    def keys_containing(self, start: int, end: int) -> List[Any]:
+        """@brief Return keys of memories that contain either of the given addresses.
+
+        The returned list is normally empty or has one entry. Keys are collected before being
+        returned so the caller can remove those memories from the map.
+        """
+        hi = bisect_right(self._starts, max(start, end))
+        return [key for prev_start, prev_end, key in islice(self._ranges, hi)
+                if (prev_start <= start < prev_end) or (prev_start <= end < prev_end)]
+
+def _intern_attributes(element: Element) -> None:
+    """@brief Replace an element's attribute values with interned strings.
+
+    Used for the memory, algorithm, and debug elements retained by devices. Their names,
+    addresses, sizes, access, and flag values are repeated many times throughout a PDSC, so
+    interning them means devices share a single copy of each string.
+    """
+    attrib = element.attrib
+    for key, value in attrib.items():
+        attrib[key] = sys.intern(value)
 
 def _get_part_number_from_element(element: Element) -> str:
     """@brief Extract the part number from a device or variant XML element."""
@@ -75,15 +191,17 @@ class CmsisPack:
     def __init__(self, file_or_path: Union[str, zipfile.ZipFile, IO[bytes]]) -> None:
         """@brief Constructor.
 
-        Opens the CMSIS-Pack and builds instances of CmsisPackDevice for all the devices
-        and variants defined within the pack.
+        Opens the CMSIS-Pack and locates its .pdsc file. The .pdsc is parsed and instances of
+        CmsisPackDevice for all the devices and variants defined within the pack are built when
+        the `devices` property is first accessed.
 
         @param self
         @param file_or_path The .pack file to open. May be a string that is the path to the pack,
             or may be a ZipFile, or a file-like object that is already opened.
 
         @exception MalformedCmsisPackError The pack is not a zip file, or the .pdsc file is missing
-            from within the pack.
+            from within the pack. Errors in the .pdsc itself are not detected until the `devices`
+            property is accessed, which raises MalformedCmsisPackError if the .pdsc is malformed.
         """
         if isinstance(file_or_path, zipfile.ZipFile):
             self._pack_file = file_or_path
@@ -93,16 +211,29 @@ class CmsisPack:
             except zipfile.BadZipFile as err:
                 raise MalformedCmsisPackError(f"Failed to open CMSIS-Pack '{file_or_path}': {err}") from err
 
-        # Find the .pdsc file.
-        for name in self._pack_file.namelist():
-            if name.endswith('.pdsc'):
-                self._pdscName = name
-                break
-        else:
+        # Build an index of the pack's members.
+        infolist = self._pack_file.infolist()
+        self._zip_index: Dict[str, zipfile.ZipInfo] = {info.filename: info for info in infolist}
+
+        # Find the .pdsc file. It is normally one of the first members of the pack.
+        pdsc_info = next((info for info in infolist if info.filename.endswith('.pdsc')), None)
+        if pdsc_info is None:
             raise MalformedCmsisPackError(f"CMSIS-Pack '{file_or_path}' is missing a .pdsc file")
+        self._pdsc_info = pdsc_info
+        self._pdscName = pdsc_info.filename
+        self._file_cache: Dict[str, bytes] = {}
+        self._file_cache_bytes = 0
 
-        with self._pack_file.open(self._pdscName) as pdscFile:
-            self._pdsc = CmsisPackDescription(self, pdscFile)
+        # The .pdsc is streamed out of the pack when it is parsed, rather than being held in
+        # memory until then.
+        self._pdsc = CmsisPackDescription(self, self._open_pdsc)
+
+    def _open_pdsc(self) -> IO[bytes]:
+        """@brief Open the pack's .pdsc file.
+
+        The zip member stream is returned directly, since it already buffers its reads.
+        """
+        return self._pack_file.open(self._pdsc_info)
 
     @property
     def filename(self) -> Optional[str]:
@@ -116,7 +247,10 @@ class CmsisPack:
 
     @property
     def devices(self) -> List["CmsisPackDevice"]:
-        """@brief A list of CmsisPackDevice objects for every part number defined in the pack."""
+        """@brief A list of CmsisPackDevice objects for every part number defined in the pack.
+
+        @exception MalformedCmsisPackError The .pdsc file is not valid XML.
+        """
         return self._pdsc.devices
 
     def get_file(self, filename) -> IO[bytes]:
@@ -126,7 +260,11 @@ class CmsisPack:
         @param filename Relative path within the pack. May use forward or back slashes.
         @return A BytesIO object is returned that contains all of the data from the file
             in the pack. This is done to isolate the returned file from how the pack was
-            opened (due to particularities of the ZipFile implementation).
+            opened (due to particularities of the ZipFile implementation). The contents of
+            the most recently used small files, other than SVDs, are cached, and a new BytesIO is
+            returned for each call.
+
+        @exception KeyError The file does not exist in the pack.
         """
         filename = filename.replace('\\', '/')
 
@@ -136,33 +274,167 @@ class CmsisPack:
         if len(pdsc_base) == 2:
             filename = f'{pdsc_base[0]}/{filename}'
 
-        return io.BytesIO(self._pack_file.read(filename))
+        # Move a cached file to the end of the cache, so the least recently used file is first.
+        data = self._file_cache.pop(filename, None)
+        if data is None:
+            # The ZipInfo is passed to read() directly.
+            data = self._pack_file.read(self._zip_index[filename])
+            if (len(data) > _FILE_CACHE_MAX_BYTES
+                    or filename.lower().endswith(_FILE_CACHE_EXCLUDED_EXTENSIONS)):
+                return io.BytesIO(data)
+            self._file_cache_bytes += len(data)
+            while (len(self._file_cache) >= _FILE_CACHE_SIZE
+                    or self._file_cache_bytes > _FILE_CACHE_MAX_BYTES):
+                self._file_cache_bytes -= len(self._file_cache.pop(next(iter(self._file_cache))))
+        self._file_cache[filename] = data
+
+        # BytesIO shares the buffer of the bytes object instead of copying it, unless the file
+        # object is written to, so the cached data is never modified.
+        return io.BytesIO(data)
+
+def _load_pack(file_or_path: Union[str, zipfile.ZipFile, IO[bytes]]) -> CmsisPack:
+    """@brief Open a CMSIS-Pack and parse its devices."""
+    pack = CmsisPack(file_or_path)
+    # Accessing the devices parses the PDSC.
+    pack.devices
+    return pack
+
+def load_packs(
+        packs: Iterable[Union[str, zipfile.ZipFile, IO[bytes]]],
+        max_workers: Optional[int] = None
+        ) -> List[CmsisPack]:
+    """@brief Open multiple CMSIS-Packs concurrently.
+
+    Each pack is opened and its PDSC parsed on a thread pool, so the devices of the returned packs
+    are already available. Zip decompression and file reads release the GIL and can overlap
+    between packs. XML parsing and device creation mostly hold the GIL, so the speedup depends on
+    how much of the load time is spent in I/O and decompression.
+
+    @param packs Iterable of .pack paths, ZipFile instances, or opened file-like objects.
+    @param max_workers Maximum number of threads, or None for the ThreadPoolExecutor default.
+    @return List of CmsisPack objects in the same order as _packs_.
+
+    @exception MalformedCmsisPackError One of the packs is not a zip file, or its .pdsc file is
+        missing or malformed.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_load_pack, packs))
+
+## Tags of the top-level sections of a PDSC that are cleared once parsed by lxml.
+_PDSC_SECTION_TAGS = (
+        'releases',
+        'keywords',
+        'generators',
+        'requirements',
+        'licenseSets',
+        'conditions',
+        'components',
+        'apis',
+        'taxonomy',
+        'devices',
+        'boards',
+        'examples',
+    )
+
+def _iter_pdsc_families(pdsc_file: Union[str, "os.PathLike", IO[bytes]]) -> Iterator[Element]:
+    """@brief Parse a PDSC file and yield its family elements.
+
+    If lxml is enabled by `_USE_LXML`, the PDSC is parsed incrementally. lxml only reports the end
+    of families and of the top-level sections, and each section is cleared once it has been
+    parsed. This is required because any lxml element retained by a device keeps its entire
+    document alive. lxml is told not to resolve entities or access the network, since versions
+    before 5.0 resolve external entities by default.
+
+    Otherwise the whole PDSC is parsed by the C accelerated stdlib parser, which is faster than
+    handling an event for every element in Python. Stdlib elements do not reference their parent,
+    so the rest of the tree is freed once the families have been processed. The stdlib parser
+    never expands external entities.
+    """
+    if isinstance(pdsc_file, os.PathLike):
+        pdsc_file = os.fspath(pdsc_file)
+    if _USE_LXML:
+        for _, elem in lxml_etree.iterparse(pdsc_file, events=('end',),
+                    tag=('family',) + _PDSC_SECTION_TAGS, resolve_entities=False, no_network=True):
+            if elem.tag == 'family':
+                yield elem
+            else:
+                elem.clear()
+    else:
+        yield from parse(pdsc_file).getroot().iter('family')
 
 class CmsisPackDescription:
     """@brief Parser for the PDSC XML file describing a CMSIS-Pack.
     """
 
-    def __init__(self, pack: CmsisPack, pdsc_file: IO) -> None:
+    def __init__(self,
+            pack: CmsisPack,
+            pdsc_file: Union[IO[bytes], str, "os.PathLike", Callable[[], IO[bytes]]]
+            ) -> None:
         """@brief Constructor.
 
         @param self This object.
         @param pack Reference to the CmsisPack instance.
-        @param pdsc_file A file-like object for the .pdsc contained in _pack_.
+        @param pdsc_file A file-like object for the .pdsc contained in _pack_. May also be a path
+            to a .pdsc file, or a callable that returns a new file-like object for the .pdsc. A
+            path or callable is not opened until the PDSC is parsed.
         """
         self._pack = pack
 
-        # Convert PDSC into an ElementTree.
-        self._pdsc = ElementTree(file=pdsc_file)
-
         self._state_stack: List[_DeviceInfo] = []
+        self._prefix_maps: List[Dict[str, Dict]] = []
+        self._prefix_families: List[Tuple[str, ...]] = []
         self._devices: List["CmsisPackDevice"] = []
 
         # Remember if we have already warned about overlapping memory regions
         # so we can limit these to one warning per DFP
         self._warned_overlapping_memory_regions = False
 
-        # Extract devices.
-        for family in self._pdsc.iter('family'):
+        # Parsing of the PDSC is deferred until the devices are first accessed. A file object may
+        # be closed once the constructor returns, so its contents are read now.
+        self._pdsc_source: Union[str, "os.PathLike", bytes, Callable[[], IO[bytes]], None]
+        if isinstance(pdsc_file, (str, os.PathLike)) or callable(pdsc_file):
+            self._pdsc_source = pdsc_file
+        else:
+            self._pdsc_source = pdsc_file.read()
+        self._parsed = False
+        self._parse_lock = threading.Lock()
+
+    def _parse(self) -> None:
+        """@brief Parse the PDSC and create devices.
+
+        If parsing fails, any devices already created are discarded so that a later attempt starts
+        from a clean state.
+
+        @exception MalformedCmsisPackError The PDSC is not valid XML.
+        """
+        source = self._pdsc_source
+        assert source is not None
+        try:
+            if isinstance(source, bytes):
+                self._parse_file(io.BytesIO(source))
+            elif callable(source):
+                with source() as pdsc_file:
+                    self._parse_file(pdsc_file)
+            else:
+                self._parse_file(source)
+        except Exception as err:
+            self._devices = []
+            self._state_stack = []
+            self._prefix_maps = []
+            self._prefix_families = []
+            if isinstance(err, _XML_PARSE_ERRORS):
+                filename = self.pack.filename if self.pack else "unknown"
+                raise MalformedCmsisPackError(f"Failed to parse the .pdsc of CMSIS-Pack '{filename}': {err}") from err
+            raise
+
+        self._pdsc_source = None
+        self._parsed = True
+
+    def _parse_file(self, pdsc_file: Union[str, "os.PathLike", IO[bytes]]) -> None:
+        """@brief Create devices from the PDSC read from a file-like object or path."""
+        # Extract devices. The parsed PDSC is not kept, so large sections such as <components>
+        # and <examples> are not retained.
+        for family in _iter_pdsc_families(pdsc_file):
             self._parse_devices(family)
 
     @property
@@ -172,174 +444,259 @@ class CmsisPackDescription:
 
     @property
     def devices(self) -> List["CmsisPackDevice"]:
-        """@brief A list of CmsisPackDevice objects for every part number defined in the pack."""
+        """@brief A list of CmsisPackDevice objects for every part number defined in the pack.
+
+        The PDSC is parsed the first time this property is accessed.
+
+        @exception MalformedCmsisPackError The PDSC is not valid XML.
+        """
+        if not self._parsed:
+            with self._parse_lock:
+                if not self._parsed:
+                    self._parse()
         return self._devices
 
-    def _parse_devices(self, parent: Element) -> None:
-        # Extract device description elements we care about.
-        newState = _DeviceInfo(element=parent)
-        children: List[Element] = []
-        for elem in parent:
-            if elem.tag == 'memory':
-                newState.memories.append(elem)
-            elif elem.tag == 'algorithm':
-                newState.algos.append(elem)
-            elif elem.tag == 'debug':
-                newState.debugs.append(elem)
-            # Save any elements that we will recurse into.
-            elif elem.tag in ('subFamily', 'device', 'variant'):
-                children.append(elem)
-
-        # Push the new device description state onto the stack.
-        self._state_stack.append(newState)
-
-        # Create a device object if this element defines one.
-        if parent.tag in ('device', 'variant'):
-            # Build device info from elements applying to this device.
-            deviceInfo = _DeviceInfo(element=parent,
-                                        families=self._extract_families(),
-                                        memories=self._extract_memories(),
-                                        algos=self._extract_algos(),
-                                        debugs=self._extract_debugs()
-                                        )
-
-            dev = CmsisPackDevice(self.pack, deviceInfo)
-            self._devices.append(dev)
-
-        # Recursively process subelements.
-        for elem in children:
-            self._parse_devices(elem)
+    ## Map from device description element tag to the _DeviceInfo attribute that collects it.
+    _CHILD_DISPATCH = {
+            'memory': 'memories',
+            'algorithm': 'algos',
+            'debug': 'debugs',
+        }
 
-        self._state_stack.pop()
+    ## Tags of elements that _parse_devices() descends into.
+    _CHILD_DEVICE_TAGS = frozenset(('subFamily', 'device', 'variant'))
+
+    def _parse_devices(self, family: Element) -> None:
+        """@brief Create devices for all device and variant elements nested within a family.
+
+        The family hierarchy is walked with an explicit stack rather than by recursion. A None
+        entry on the walk stack marks where the device state pushed for an element is popped,
+        after all of that element's children have been processed.
+        """
+        dispatch_names = self._CHILD_DISPATCH
+        child_tags = self._CHILD_DEVICE_TAGS
+        # lxml creates new attribute strings on every access, so interning is only useful with
+        # ElementTree. Attributes of the family, subFamily, device, and variant elements are not
+        # interned, because few of their values are repeated.
+        intern_attributes = not _USE_LXML
+        walk_stack: List[Optional[Element]] = [family]
+        while walk_stack:
+            parent = walk_stack.pop()
+            if parent is None:
+                self._pop_state()
+                continue
+
+            # Extract device description elements we care about.
+            newState = _DeviceInfo(element=parent)
+            children: List[Element] = []
+            dispatch = {tag: getattr(newState, name).append for tag, name in dispatch_names.items()}
+            for elem in parent:
+                tag = elem.tag
+                appender = dispatch.get(tag)
+                if appender is not None:
+                    if intern_attributes:
+                        _intern_attributes(elem)
+                    appender(elem)
+                # Save any elements that we will descend into.
+                elif tag in child_tags:
+                    children.append(elem)
+
+            # Push the new device description state onto the stack.
+            self._push_state(newState)
+
+            # Create a device object if this element defines one.
+            if parent.tag in ('device', 'variant'):
+                # Build device info from elements applying to this device.
+                deviceInfo = _DeviceInfo(element=parent,
+                                            families=self._extract_families(),
+                                            memories=self._extract_memories(),
+                                            algos=self._extract_algos(),
+                                            debugs=self._extract_debugs()
+                                            )
+
+                dev = CmsisPackDevice(self.pack, deviceInfo)
+                self._devices.append(dev)
+
+            # Process subelements in document order, then pop this element's state.
+            walk_stack.append(None)
+            walk_stack.extend(reversed(children))
 
     def _extract_families(self) -> List[str]:
-        """@brief Generate list of family names for a device."""
-        families = []
-        for state in self._state_stack:
-            elem = state.element
-            if elem.tag == 'family':
-                families += [elem.attrib['Dvendor'], elem.attrib['Dfamily']]
-            elif elem.tag == 'subFamily':
-                families += [elem.attrib['DsubFamily']]
-        return families
+        """@brief Generate list of family names for a device.
+
+        The family names are accumulated by _push_state() as the hierarchy is descended.
+        """
+        return list(self._prefix_families[-1])
+
+    def _push_state(self, state: _DeviceInfo) -> None:
+        """@brief Push a device description state onto the state stack.
 
-    ## Typevar used for _extract_items().
-    V = TypeVar('V')
+        Along with the state, a dictionary of item maps is pushed onto the prefix map stack. For
+        each type of saved element, the new map is a copy of the enclosing state's map that has
+        been updated by running the filter for that element type over this state's elements. Each
+        level of the hierarchy is therefore filtered only once, no matter how many devices and
+        variants are nested within it.
 
-    def _extract_items(self, state_info_name: str, filter: Callable[[Dict[Any, V], Element], None]) -> List[V]:
+        The family names for the new state are likewise the enclosing state's family names plus
+        any contributed by a family or subFamily element.
+        """
+        self._state_stack.append(state)
+
+        families = self._prefix_families[-1] if self._prefix_families else ()
+        elem = state.element
+        if elem.tag == 'family':
+            families += (elem.attrib['Dvendor'], elem.attrib['Dfamily'])
+        elif elem.tag == 'subFamily':
+            families += (elem.attrib['DsubFamily'],)
+        self._prefix_families.append(families)
+
+        outer_maps = self._prefix_maps[-1] if self._prefix_maps else None
+        maps: Dict[str, Dict] = {}
+        filters: Tuple[Tuple[str, Callable[[Any, Element], None], Callable[[], Dict]], ...] = (
+                ('memories', self._filter_memory, _MemoryItemMap),
+                ('algos', self._filter_algo, dict),
+                ('debugs', self._filter_debug, dict),
+            )
+        for state_info_name, filter, map_factory in filters:
+            map = outer_maps[state_info_name].copy() if outer_maps is not None else map_factory()
+            for elem in getattr(state, state_info_name):
+                try:
+                    filter(map, elem)
+                except (KeyError, ValueError) as err:
+                    LOG.debug("error parsing CMSIS-Pack: %s", err)
+            maps[state_info_name] = map
+        self._prefix_maps.append(maps)
+
+    def _pop_state(self) -> None:
+        """@brief Pop the innermost device description state and its item maps."""
+        self._state_stack.pop()
+        self._prefix_families.pop()
+        self._prefix_maps.pop()
+
+    def _extract_items(self, state_info_name: str) -> List[Any]:
         """@brief Generic extractor utility.
 
-        Iterates over saved elements for the specified device state info for each level of the
-        device state stack, from outer to inner, calling the provided filter callback each
-        iteration. A dictionary object is created and repeatedly passed to the filter callback, so
-        state can be stored across calls to the filter.
+        The filter callback for each type of element is run over the saved elements for each level
+        of the device state stack, from outer to inner, as the states are pushed. A dictionary
+        object is passed to the filter callback, so state can be stored across calls to the filter.
 
         The general idea is that the filter callback extracts some identifying information from the
         element it is given and uses that as a key in the dictionary. When the filter is called for
         more deeply nested elements, those elements will override the any previously examined
         elements with the same identifier.
 
-        @return All values from the dictionary.
+        @return All values from the dictionary for the innermost state.
         """
-        map = {}
-        for state in self._state_stack:
-            for elem in getattr(state, state_info_name):
-                try:
-                    filter(map, elem)
-                except (KeyError, ValueError) as err:
-                    LOG.debug("error parsing CMSIS-Pack: " + str(err))
-        return list(map.values())
+        return list(self._prefix_maps[-1][state_info_name].values())
 
     def _extract_memories(self) -> List[Element]:
         """@brief Extract memory elements.
 
-        The unique identifier is a bi-tuple of the memory's name, which is either the 'name' or 'id' attribute,
-        in that order, plus the pname. If neither attribute exists, the region base and size are turned into
-        a string.
-
-        In addition to the name based filtering, memory regions are checked to prevent overlaps.
+        See _filter_memory() for how memory elements are identified.
         """
-        def get_start_and_size(elem: Element) -> Tuple[int, int]:
-            try:
-                start = int(elem.attrib['start'], base=0)
-                size = int(elem.attrib['size'], base=0)
-            except (KeyError, ValueError):
-                LOG.warning("memory region missing address")
-                raise
-            return (start, size)
-
-        def filter(map: Dict, elem: Element) -> None:
-            # Inner memory regions are allowed to override outer memory
-            # regions. If this is not done properly via name/id, we must make
-            # sure not to report overlapping memory regions to gdb since it
-            # will ignore those completely, see:
-            # https://github.com/pyocd/pyOCD/issues/980
-            start, size = get_start_and_size(elem)
-            if 'name' in elem.attrib: # 'name' takes precedence over 'id'.
-                name = elem.attrib['name']
-            elif 'id' in elem.attrib:
-                name = elem.attrib['id']
-            else:
-                # Neither option for memory name was specified, so use the address range.
-                # Use the start and size for a name.
-                name = "%08x:%08x" % (start, size)
-
-            pname = elem.attrib.get('Pname', None)
-            info = (name, pname)
-
-            if info in map:
-                del map[info]
-            for k in list(map.keys()):
-                prev_pname = k[1]
-                # Previously, we would not check for overlaps if the pname was different. But because pyocd
-                # currently only supports one memory map for the whole device, we have to ignore the pname for
-                # now.
-                prev_elem = map[k]
-                prev_start, prev_size = get_start_and_size(prev_elem)
-                # Overlap: start or end between previous start and previous end
-                end = start + size - 1
-                prev_end = prev_start + prev_size - 1
-                if (prev_start <= start < prev_end) or (prev_start <= end < prev_end):
-                    # Only report warnings for overlapping regions from the same processor. Allow regions for different
-                    # processors to override each other, since we don't yet support maps for each processor.
-                    if (pname == prev_pname) and not self._warned_overlapping_memory_regions:
-                        filename = self.pack.filename if self.pack else "unknown"
-                        LOG.warning("Overlapping memory regions in file %s (%s); deleting outer region. "
-                                    "Further warnings will be suppressed for this file.",
-                                    filename, _get_part_number_from_element(self._state_stack[-1].element))
-                        self._warned_overlapping_memory_regions = True
-                    del map[k]
-
-            map[info] = elem
-
-        return self._extract_items('memories', filter)
+        return [elem for _, _, elem in self._extract_items('memories')]
 
     def _extract_algos(self) -> List[Element]:
         """@brief Extract algorithm elements.
 
+        See _filter_algo() for how algorithm elements are identified.
+        """
+        return self._extract_items('algos')
+
+    def _extract_debugs(self) -> List[Element]:
+        """@brief Extract debug elements.
+
+        See _filter_debug() for how debug elements are identified.
+        """
+        return self._extract_items('debugs')
+
+    def _get_state_description(self) -> str:
+        """@brief Return a name for the innermost device state, for use in log messages."""
+        elem = self._state_stack[-1].element
+        if elem.tag in ('device', 'variant'):
+            return _get_part_number_from_element(elem)
+        elif elem.tag == 'subFamily':
+            return elem.attrib.get('DsubFamily', elem.tag)
+        else:
+            return elem.attrib.get('Dfamily', elem.tag)
+
+    def _filter_memory(self, map: _MemoryItemMap, elem: Element) -> None:
+        """@brief Filter for memory elements.
+
+        The unique identifier is a bi-tuple of the memory's name, which is either the 'name' or 'id' attribute,
+        in that order, plus the pname. If neither attribute exists, a (base, size) tuple for the region is
+        used as the name.
+
+        In addition to the name based filtering, memory regions are checked to prevent overlaps.
+        """
+        # Inner memory regions are allowed to override outer memory
+        # regions. If this is not done properly via name/id, we must make
+        # sure not to report overlapping memory regions to gdb since it
+        # will ignore those completely, see:
+        # https://github.com/pyocd/pyOCD/issues/980
+        try:
+            start = _parse_addr(elem.attrib['start'])
+            size = _parse_addr(elem.attrib['size'])
+        except (KeyError, ValueError):
+            LOG.warning("memory region missing address")
+            raise
+        name: Union[str, Tuple[int, int]]
+        if 'name' in elem.attrib: # 'name' takes precedence over 'id'.
+            name = elem.attrib['name']
+        elif 'id' in elem.attrib:
+            name = elem.attrib['id']
+        else:
+            # Neither option for memory name was specified, so use the address range. The name is
+            # only used as part of the map key, so the (start, size) tuple is used directly.
+            name = (start, size)
+
+        pname = elem.attrib.get('Pname', None)
+        info = (name, pname)
+
+        map.remove(info)
+
+        # Overlap: start or end between previous start and previous end
+        end = start + size - 1
+        for k in map.keys_containing(start, end):
+            prev_pname = k[1]
+            # Previously, we would not check for overlaps if the pname was different. But because pyocd
+            # currently only supports one memory map for the whole device, we have to ignore the pname for
+            # now.
+            # Only report warnings for overlapping regions from the same processor. Allow regions for different
+            # processors to override each other, since we don't yet support maps for each processor.
+            if (pname == prev_pname) and not self._warned_overlapping_memory_regions:
+                filename = self.pack.filename if self.pack else "unknown"
+                LOG.warning("Overlapping memory regions in file %s (%s); deleting outer region. "
+                            "Further warnings will be suppressed for this file.",
+                            filename, self._get_state_description())
+                self._warned_overlapping_memory_regions = True
+            map.remove(k)
+
+        map.add(info, start, size, elem)
+
+    def _filter_algo(self, map: Dict, elem: Element) -> None:
+        """@brief Filter for algorithm elements.
+
         The unique identifier is the algorithm's memory address range.
 
         Any algorithm elements with a 'style' attribuet not set to 'Keil' (case-insensitive) are
         skipped.
         """
-        def filter(map: Dict, elem: Element) -> None:
-            # We only support Keil FLM style flash algorithms (for now).
-            if ('style' in elem.attrib) and (elem.attrib['style'].lower() != 'keil'):
-                LOG.debug("skipping non-Keil flash algorithm")
-                return
+        # We only support Keil FLM style flash algorithms (for now).
+        if ('style' in elem.attrib) and (elem.attrib['style'].lower() != 'keil'):
+            LOG.debug("skipping non-Keil flash algorithm")
+            return
 
-            # Both start and size are required.
-            start = int(elem.attrib['start'], base=0)
-            size = int(elem.attrib['size'], base=0)
-            memrange = (start, size)
+        # Both start and size are required.
+        start = _parse_addr(elem.attrib['start'])
+        size = _parse_addr(elem.attrib['size'])
+        memrange = (start, size)
 
-            # An algo with the same range as an existing algo will override the previous.
-            map[memrange] = elem
+        # An algo with the same range as an existing algo will override the previous.
+        map[memrange] = elem
 
-        return self._extract_items('algos', filter)
-
-    def _extract_debugs(self) -> List[Element]:
-        """@brief Extract debug elements.
+    def _filter_debug(self, map: Dict, elem: Element) -> None:
+        """@brief Filter for debug elements.
 
         If the debug element does not have a 'Pname' element, its identifier is set to "*" to
         represent that it applies to all processors.
@@ -348,22 +705,37 @@ class CmsisPackDescription:
         present. When 'Pname' is detected and a "*" key is in the map, the map is cleared before
         adding the current element.
         """
-        def filter(map: Dict, elem: Element) -> None:
-            if 'Pname' in elem.attrib:
-                name = elem.attrib['Pname']
-                unit = elem.attrib.get('Punit', 0)
-                name += str(unit)
-
-                if '*' in map:
-                    map.clear()
-                map[name] = elem
-            else:
-                # No processor name was provided, so this debug element applies to
-                # all processors.
-                map.clear()
-                map['*'] = elem
+        if 'Pname' in elem.attrib:
+            name = elem.attrib['Pname']
+            unit = elem.attrib.get('Punit', 0)
+            name += str(unit)
 
-        return self._extract_items('debugs', filter)
+            if '*' in map:
+                map.clear()
+            map[name] = elem
+        else:
+            # No processor name was provided, so this debug element applies to
+            # all processors.
+            map.clear()
+            map['*'] = elem
+
+## Region classes for each type of memory created from `<memory>` elements.
+_DEVICE_REGION_CLASS = MEMORY_TYPE_CLASS_MAP[MemoryType.DEVICE]
+_RAM_REGION_CLASS = MEMORY_TYPE_CLASS_MAP[MemoryType.RAM]
+_ROM_REGION_CLASS = MEMORY_TYPE_CLASS_MAP[MemoryType.ROM]
+
+## Boolean attribute values mapped to their meaning. Covers the common spellings exactly, so
+# _get_bool_attribute() only has to normalise unusual values.
+_BOOL_MAP = {
+        'true': True,
+        'True': True,
+        'TRUE': True,
+        '1': True,
+        'false': False,
+        'False': False,
+        'FALSE': False,
+        '0': False,
+    }
 
 def _get_bool_attribute(elem: Element, name: str, default: bool = False) -> bool:
     """@brief Extract an XML attribute with a boolean value.
@@ -376,16 +748,21 @@ def _get_bool_attribute(elem: Element, name: str, default: bool = False) -> bool
     @param default An optional default value if the attribute is missing. If not provided,
         the default is False.
     """
-    if name not in elem.attrib:
+    value = elem.attrib.get(name)
+    if value is None:
         return default
-    else:
-        value = elem.attrib[name].strip().lower()
-        if value in ("true", "1"):
-            return True
-        elif value in ("false", "0"):
-            return False
-        else:
-            return default
+    result = _BOOL_MAP.get(value)
+    if result is not None:
+        return result
+    return _BOOL_MAP.get(value.strip().lower(), default)
+
+## Map from the debug element's defaultResetSequence attribute to reset type. Any other sequence
+# uses the default of Target.ResetType.SW.
+_RESET_SEQUENCE_MAP = {
+        'ResetHardware': Target.ResetType.HW,
+        'ResetSystem': Target.ResetType.SW_SYSRESETREQ,
+        'ResetProcessor': Target.ResetType.SW_VECTRESET,
+    }
 
 class CmsisPackDevice:
     """@brief Wraps a device defined in a CMSIS Device Family Pack.
@@ -407,9 +784,17 @@ class CmsisPackDevice:
         self._info: _DeviceInfo = device_info
         self._part: str = _get_part_number_from_element(device_info.element)
         self._regions: List[MemoryRegion] = []
+        self._algo_cache: Dict[str, Optional[PackFlashAlgo]] = {}
+        self._algo_tree: Optional[IntervalTree] = None
+        self._sorted_regions: Optional[List[MemoryRegion]] = None
+        self._region_starts: List[int] = []
+        self._regions_overlap: bool = False
         self._saw_startup: bool = False
         self._default_ram: Optional[MemoryRegion] = None
         self._memory_map: Optional[MemoryMap] = None
+        self._memory_map_lock = threading.Lock()
+        self._families: Optional[List[str]] = None
+        self._default_reset_type: Optional[Target.ResetType] = None
 
     def _build_memory_regions(self) -> None:
         """@brief Creates memory region instances for the device.
@@ -426,60 +811,85 @@ class CmsisPackDevice:
                     access = elem.attrib['access']
 
                     if ('p' in access):
-                        type = MemoryType.DEVICE
+                        region_class = _DEVICE_REGION_CLASS
                     elif ('w' in access):
-                        type = MemoryType.RAM
+                        region_class = _RAM_REGION_CLASS
                     else:
-                        type = MemoryType.ROM
+                        region_class = _ROM_REGION_CLASS
                 elif 'id' in elem.attrib:
                     name = elem.attrib['id']
 
                     if 'RAM' in name:
                         access = 'rwx'
-                        type = MemoryType.RAM
+                        region_class = _RAM_REGION_CLASS
                     else:
                         access = 'rx'
-                        type = MemoryType.ROM
+                        region_class = _ROM_REGION_CLASS
                 else:
                     continue
 
                 # Both start and size are required attributes.
-                start = int(elem.attrib['start'], base=0)
-                size = int(elem.attrib['size'], base=0)
+                start = _parse_addr(elem.attrib['start'])
+                size = _parse_addr(elem.attrib['size'])
 
                 isDefault = _get_bool_attribute(elem, 'default')
                 isStartup = _get_bool_attribute(elem, 'startup')
                 if isStartup:
                     self._saw_startup = True
 
-                attrs = {
-                        'name': name,
-                        'start': start,
-                        'length': size,
-                        'access': access,
-                        'is_default': isDefault,
-                        'is_boot_memory': isStartup,
-                        'is_testable': isDefault,
-                        'alias': elem.attrib.get('alias', None),
-                    }
-
                 # Create the memory region and add to map.
-                region = MEMORY_TYPE_CLASS_MAP[type](**attrs)
+                region = region_class(
+                        name=name,
+                        start=start,
+                        length=size,
+                        access=access,
+                        is_default=isDefault,
+                        is_boot_memory=isStartup,
+                        is_testable=isDefault,
+                        alias=elem.attrib.get('alias', None),
+                    )
                 self._regions.append(region)
 
                 # Record the first default ram for use in flash algos.
-                if self._default_ram is None and type == MemoryType.RAM and isDefault:
+                if self._default_ram is None and region_class is _RAM_REGION_CLASS and isDefault:
                     self._default_ram = region
             except (KeyError, ValueError) as err:
                 # Ignore errors.
                 LOG.debug("ignoring error parsing memories for CMSIS-Pack devices %s: %s",
                     self.part_number, str(err))
 
+        self._invalidate_region_index()
+
+    def _invalidate_region_index(self) -> None:
+        """@brief Discard the index used by _get_containing_region().
+
+        Must be called whenever the `_regions` list is modified.
+        """
+        self._sorted_regions = None
+
     def _get_containing_region(self, addr: int) -> Optional[MemoryRegion]:
-        """@brief Return the memory region containing the given address."""
-        for region in self._regions:
-            if region.contains_address(addr):
-                return region
+        """@brief Return the memory region containing the given address.
+
+        The regions are indexed by start address on first use after `_regions` is modified, and
+        the index is searched with bisect. Regions from a PDSC may overlap, for instance when an
+        inner region fully contains an outer one, in which case the regions are scanned in order
+        so the first region containing the address is returned.
+        """
+        if self._sorted_regions is None:
+            self._sorted_regions = sorted(self._regions, key=lambda r: r.start)
+            self._region_starts = [r.start for r in self._sorted_regions]
+            self._regions_overlap = any(prev.end >= r.start
+                    for prev, r in zip(self._sorted_regions, self._sorted_regions[1:]))
+
+        if self._regions_overlap:
+            for region in self._regions:
+                if region.contains_address(addr):
+                    return region
+            return None
+
+        i = bisect_right(self._region_starts, addr) - 1
+        if i >= 0 and addr <= self._sorted_regions[i].end:
+            return self._sorted_regions[i]
         return None
 
     def _build_flash_regions(self) -> None:
@@ -492,14 +902,18 @@ class CmsisPackDevice:
         """
         # Must have a default ram.
         if self._default_ram is None:
-            LOG.warning("CMSIS-Pack device %s has no default RAM defined, cannot program flash" % self.part_number)
+            LOG.warning("CMSIS-Pack device %s has no default RAM defined, cannot program flash", self.part_number)
             return
 
         # Can't import at top level due to import loops.
         from ...core.session import Session
 
-        regions_to_delete = [] # List of regions to delete.
-        regions_to_add = [] # List of FlashRegion objects to add.
+        regions_to_delete: List[MemoryRegion] = [] # List of regions to delete.
+        regions_to_add: List[FlashRegion] = [] # List of FlashRegion objects to add.
+
+        # Check once whether details of flash algos should be logged.
+        current_session = Session.get_current()
+        log_flm_info = bool(current_session and current_session.options.get("debug.log_flm_info"))
 
         # Create flash algo dicts once we have the full memory map.
         for i, region in enumerate(self._regions):
@@ -525,25 +939,26 @@ class CmsisPackDevice:
             regions_to_delete.append(region)
 
             # Log details of this flash algo if the debug option is enabled.
-            current_session = Session.get_current()
-            if current_session and current_session.options.get("debug.log_flm_info"):
+            if log_flm_info:
                 LOG.debug("Flash algo info: %s", packAlgo.flash_info)
 
             # Choose the page size. The check for <=32 is to handle some flash algos with incorrect
             # page sizes that are too small and probably represent the phrase size.
             page_size = packAlgo.page_size
             if page_size <= 32:
-                page_size = min(s[1] for s in packAlgo.sector_sizes)
+                page_size = min(map(itemgetter(1), packAlgo.sector_sizes))
 
-            # Select the RAM to use for the algo.
-            try:
-                # See if an explicit RAM range was specified for the algo.
-                ram_start = int(algo_element.attrib['RAMstart'], base=0)
+            # Select the RAM to use for the algo. See if an explicit RAM range was specified for it.
+            algo_attrib = algo_element.attrib
+            ram_start_str = algo_attrib.get('RAMstart')
+            if ram_start_str is not None:
+                ram_start = _parse_addr(ram_start_str)
 
                 # The region size comes either from the RAMsize attribute, the containing region's bounds, or
                 # a large, arbitrary value.
-                if 'RAMsize' in algo_element.attrib:
-                    ram_size = int(algo_element.attrib['RAMsize'], base=0)
+                ram_size_str = algo_attrib.get('RAMsize')
+                if ram_size_str is not None:
+                    ram_size = _parse_addr(ram_size_str)
                 else:
                     containing_region = self._get_containing_region(ram_start)
                     if containing_region is not None:
@@ -556,7 +971,7 @@ class CmsisPackDevice:
                         ram_size = 128 * 1024
 
                 ram_for_algo = RamRegion(start=ram_start, length=ram_size)
-            except KeyError:
+            else:
                 # No RAM addresses were given, so go with the RAM marked default.
                 ram_for_algo = self._default_ram
 
@@ -565,14 +980,15 @@ class CmsisPackDevice:
             algo = packAlgo.get_pyocd_flash_algo(page_size, ram_for_algo)
 
             # Create a separate flash region for each sector size range.
-            regions_to_add += list(self._split_flash_region_by_sector_size(
+            regions_to_add.extend(self._split_flash_region_by_sector_size(
                                             region, page_size, algo, packAlgo)) # type: ignore
 
-        # Now update the regions list.
-        for region in regions_to_delete:
-            self._regions.remove(region)
-        for region in regions_to_add:
-            self._regions.append(region)
+        # Now update the regions list. Regions are matched by identity in a single pass, rather
+        # than removing each one with a separate scan and equality tests.
+        delete_ids = {id(r) for r in regions_to_delete}
+        self._regions = [r for r in self._regions if id(r) not in delete_ids]
+        self._regions.extend(regions_to_add)
+        self._invalidate_region_index()
 
     def _split_flash_region_by_sector_size(self,
             region: MemoryRegion,
@@ -581,16 +997,28 @@ class CmsisPackDevice:
             pack_algo: PackFlashAlgo) -> Iterator[FlashRegion]:
         """@brief Yield separate flash regions for each sector size range."""
         # The sector_sizes attribute is a list of bi-tuples of (start-address, sector-size), sorted by start address.
-        for j, (offset, sector_size) in enumerate(pack_algo.sector_sizes):
-            start = region.start + offset
+        sector_sizes = pack_algo.sector_sizes
+        sector_size_count = len(sector_sizes)
+        has_multiple_sector_sizes = sector_size_count > 1
+        region_start = region.start
+        region_end = region.end
+        base_name = region.name
+        access = region.access
+        is_default = region.is_default
+        is_testable = region.is_testable
+        alias = region.alias
+        region_is_boot = region.is_boot_memory
+        erased_byte_value = pack_algo.flash_info.value_empty
+        for j, (offset, sector_size) in enumerate(sector_sizes):
+            start = region_start + offset
 
             # Determine the end address of the this sector range. For the last range, the end
             # is just the end of the entire region. Otherwise it's the start of the next
             # range - 1.
-            if j + 1 >= len(pack_algo.sector_sizes):
-                end = region.end
+            if j + 1 >= sector_size_count:
+                end = region_end
             else:
-                end = region.start + pack_algo.sector_sizes[j + 1][0] - 1
+                end = region_start + sector_sizes[j + 1][0] - 1
 
             # Skip wrong start and end addresses
             if end < start:
@@ -600,7 +1028,7 @@ class CmsisPackDevice:
             if page_size > sector_size:
                 region_page_size = sector_size
                 LOG.warning("Page size (%d) is larger than sector size (%d) for flash region %s; "
-                            "reducing page size to %d", page_size, sector_size, region.name,
+                            "reducing page size to %d", page_size, sector_size, base_name,
                             region_page_size)
             else:
                 region_page_size = page_size
@@ -610,51 +1038,69 @@ class CmsisPackDevice:
                 is_boot = True
                 self._saw_startup = True
             else:
-                is_boot = region.is_boot_memory
+                is_boot = region_is_boot
 
             # Construct region name. If there is more than one sector size, we need to make the region's name unique.
-            region_name = region.name
-            if len(pack_algo.sector_sizes) > 1:
+            region_name = base_name
+            if has_multiple_sector_sizes:
                 region_name += f"_{sector_size:#x}"
 
             # Construct the flash region.
             yield FlashRegion(name=region_name,
-                            access=region.access,
+                            access=access,
                             start=start,
                             end=end,
                             sector_size=sector_size,
                             page_size=region_page_size,
                             flm=pack_algo,
                             algo=algo,
-                            erased_byte_value=pack_algo.flash_info.value_empty,
-                            is_default=region.is_default,
+                            erased_byte_value=erased_byte_value,
+                            is_default=is_default,
                             is_boot_memory=is_boot,
-                            is_testable=region.is_testable,
-                            alias=region.alias)
+                            is_testable=is_testable,
+                            alias=alias)
 
     def _find_matching_algo(self, region: MemoryRegion) -> Element:
         """@brief Searches for a flash algo covering the regions's address range.'"""
-        for algo in self._info.algos:
-            # Both start and size are required attributes.
-            algoStart = int(algo.attrib['start'], base=0)
-            algoSize = int(algo.attrib['size'], base=0)
-            algoEnd = algoStart + algoSize - 1
-
-            # Check if the region indicated by start..size fits within the algo.
-            if (algoStart <= region.start <= algoEnd) and (algoStart <= region.end <= algoEnd):
-                return algo
+        if self._algo_tree is None:
+            # Both start and size are required attributes, and were already validated when the
+            # algo elements were extracted from the PDSC. The interval data records the algo's
+            # index along with its end address, so the first algo listed wins when several of
+            # them cover the region. Empty algos can never match, so they are left out.
+            tree = IntervalTree()
+            for i, algo in enumerate(self._info.algos):
+                algoStart = _parse_addr(algo.attrib['start'])
+                algoSize = _parse_addr(algo.attrib['size'])
+                if algoSize > 0:
+                    tree.addi(algoStart, algoStart + algoSize, (i, algoStart + algoSize - 1, algo))
+            self._algo_tree = tree
+
+        # Of the algos containing the region's start address, pick the first listed one that
+        # also contains the region's end address.
+        matches = [iv.data for iv in self._algo_tree[region.start] if region.end <= iv.data[1]]
+        if matches:
+            return min(matches, key=lambda m: m[0])[2]
         raise KeyError("no matching flash algorithm")
 
     def _load_flash_algo(self, filename: str) -> Optional[PackFlashAlgo]:
-        """@brief Return the PackFlashAlgo instance for the given flash algo filename."""
+        """@brief Return the PackFlashAlgo instance for the given flash algo filename.
+
+        Results are cached by filename, since several regions commonly use the same algo.
+        """
+        key = filename.replace('\\', '/')
+        if key in self._algo_cache:
+            return self._algo_cache[key]
+
+        # Default value.
+        algo = None
         if self.pack is not None:
             try:
                 algo_data = self.pack.get_file(filename)
-                return PackFlashAlgo(algo_data)
+                algo = PackFlashAlgo(algo_data)
             except FileNotFoundError:
                 pass
-        # Return default value.
-        return None
+        self._algo_cache[key] = algo
+        return algo
 
     @property
     def pack(self) -> CmsisPack:
@@ -677,22 +1123,34 @@ class CmsisPackDevice:
 
     @property
     def families(self) -> List[str]:
-        """@brief List of families the device belongs to, ordered most generic to least."""
-        return [f for f in self._info.families[1:]]
+        """@brief List of families the device belongs to, ordered most generic to least.
+
+        The same list is returned on every access, so it must not be modified by the caller.
+        """
+        if self._families is None:
+            self._families = self._info.families[1:]
+        return self._families
 
     @property
     def memory_map(self) -> MemoryMap:
-        """@brief MemoryMap object."""
-        # Lazily construct the memory map.
+        """@brief MemoryMap object.
+
+        The memory map is built on first access. None of the other properties require it, so
+        enumerating devices doesn't build it.
+        """
+        # Lazily construct the memory map. The lock ensures it is only built once, and the boot
+        # memory warning only emitted once, if devices are accessed from multiple threads.
         if self._memory_map is None:
-            self._build_memory_regions()
-            self._build_flash_regions()
+            with self._memory_map_lock:
+                if self._memory_map is None:
+                    self._build_memory_regions()
+                    self._build_flash_regions()
 
-            # Warn if there was no boot memory.
-            if not self._saw_startup:
-                LOG.warning("CMSIS-Pack device %s has no identifiable boot memory", self.part_number)
+                    # Warn if there was no boot memory.
+                    if not self._saw_startup:
+                        LOG.warning("CMSIS-Pack device %s has no identifiable boot memory", self.part_number)
 
-            self._memory_map = MemoryMap(self._regions)
+                    self._memory_map = MemoryMap(self._regions)
 
         return self._memory_map
 
@@ -712,18 +1170,13 @@ class CmsisPackDevice:
         """@brief One of the Target.ResetType enums.
         @todo Support multiple cores.
         """
-        try:
-            resetSequence = self._info.debugs[0].attrib['defaultResetSequence']
-            if resetSequence == 'ResetHardware':
-                return Target.ResetType.HW
-            elif resetSequence == 'ResetSystem':
-                return Target.ResetType.SW_SYSRESETREQ
-            elif resetSequence == 'ResetProcessor':
-                return Target.ResetType.SW_VECTRESET
-            else:
-                return Target.ResetType.SW
-        except (KeyError, IndexError):
-            return Target.ResetType.SW
+        if self._default_reset_type is None:
+            try:
+                resetSequence = self._info.debugs[0].attrib['defaultResetSequence']
+                self._default_reset_type = _RESET_SEQUENCE_MAP.get(resetSequence, Target.ResetType.SW)
+            except (KeyError, IndexError):
+                self._default_reset_type = Target.ResetType.SW
+        return self._default_reset_type
 
     def __repr__(self):
         return "<%s@%x %s>" % (self.__class__.__name__, id(self), self.part_number)
@@ -19,7 +19,7 @@ import logging
 import os
 from typing import (IO, TYPE_CHECKING, Callable, Iterable, List, Optional, Type, Union)
 
-from .cmsis_pack import (CmsisPack, CmsisPackDevice, MalformedCmsisPackError)
+from .cmsis_pack import (CmsisPack, CmsisPackDevice, MalformedCmsisPackError, load_packs)
 from ..family import FAMILIES
 from .. import TARGET
 from ...coresight.coresight_target import CoreSightTarget
@@ -83,9 +83,9 @@ class ManagedPacksImpl:
         if cache is None:
             cache = cmsis_pack_manager.Cache(True, True)
         results = []
-        for pack in ManagedPacks.get_installed_packs(cache=cache):
-            pack_path = os.path.join(cache.data_path, pack.get_pack_name())
-            pack = CmsisPack(pack_path)
+        pack_paths = [os.path.join(cache.data_path, pack.get_pack_name())
+                        for pack in ManagedPacks.get_installed_packs(cache=cache)]
+        for pack in load_packs(pack_paths):
             results += list(pack.devices)
         return sorted(results, key=lambda dev:dev.part_number)
 
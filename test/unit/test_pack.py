@@ -17,6 +17,7 @@
 
 import pytest
 import cmsis_pack_manager
+import io
 import zipfile
 from xml.etree import ElementTree
 from pathlib import Path
@@ -133,6 +134,21 @@ class TestPack(object):
         assert "MK64FN1M0xxx12" in pns
         assert "MK64FX512xxx12" in pns
 
+    # Make sure the stdlib ElementTree and lxml parsers produce the same devices. Elements are
+    # cleared as the PDSC is parsed, so the memories and algos of each device are compared too.
+    @pytest.mark.skipif(not cmsis_pack.LXML_AVAILABLE, reason="lxml is not installed")
+    def test_lxml_matches_elementtree(self, monkeypatch):
+        def describe(dev):
+            return (dev.part_number,
+                    [dict(e.attrib) for e in dev._info.memories],
+                    [dict(e.attrib) for e in dev._info.algos],
+                    [(r.name, r.start, r.end, r.type) for r in dev.memory_map])
+        lxml_devs = [describe(x) for x in cmsis_pack.CmsisPack(K64F_PACK_PATH).devices]
+        monkeypatch.setattr(cmsis_pack, '_USE_LXML', False)
+        etree_devs = [describe(x) for x in cmsis_pack.CmsisPack(K64F_PACK_PATH).devices]
+        assert lxml_devs == etree_devs
+        assert all(memories and algos for _, memories, algos, _ in etree_devs)
+
     # Make sure CmsisPack can open a zip file too.
     def test_zipfile(self):
         z = zipfile.ZipFile(K64F_PACK_PATH, 'r')
@@ -140,11 +156,62 @@ class TestPack(object):
         pns = [x.part_number for x in p.devices]
         assert "MK64FN1M0xxx12" in pns
 
+    def test_load_packs(self):
+        packs = cmsis_pack.load_packs([K64F_PACK_PATH, zipfile.ZipFile(K64F_PACK_PATH, 'r')], max_workers=2)
+        assert len(packs) == 2
+        for p in packs:
+            assert "MK64FN1M0xxx12" in [x.part_number for x in p.devices]
+
     def test_parse_device_info(self, k64f1m0):
         assert k64f1m0.vendor == "NXP"
         assert k64f1m0.families == ["MK64F12"]
         assert k64f1m0.default_reset_type == target.Target.ResetType.SW
 
+    def test_get_file_cached(self, monkeypatch, k64pack):
+        reads = []
+        zip_read = k64pack._pack_file.read
+        def counting_read(name, *args):
+            reads.append(getattr(name, 'filename', name))
+            return zip_read(name, *args)
+        monkeypatch.setattr(k64pack._pack_file, 'read', counting_read)
+
+        f1 = k64pack.get_file(K64F_1M0_FLM)
+        data = f1.read()
+        f2 = k64pack.get_file(K64F_1M0_FLM.replace('/', '\\'))
+        assert f2 is not f1
+        assert f2.read() == data
+        assert reads == [K64F_1M0_FLM]
+        with pytest.raises(KeyError):
+            k64pack.get_file("missing.FLM")
+
+    def test_get_file_cache_eviction(self, monkeypatch, k64pack):
+        monkeypatch.setattr(cmsis_pack, '_FILE_CACHE_SIZE', 2)
+        flms = ["arm/MK_P1M0.FLM", "arm/MK_P512X.FLM", "arm/MKD128_4KB_SECTOR.FLM"]
+        for name in flms:
+            k64pack.get_file(name)
+        # The least recently used file was evicted.
+        assert list(k64pack._file_cache) == flms[1:]
+        assert k64pack._file_cache_bytes == sum(len(d) for d in k64pack._file_cache.values())
+
+    def test_get_file_cache_limits(self, monkeypatch):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as z:
+            z.writestr("Test.pdsc", OVERLAP_PDSC)
+            z.writestr("Device.svd", b"<device/>")
+            z.writestr("Small.FLM", b"\0" * 16)
+            z.writestr("Large.FLM", b"\0" * 64)
+        monkeypatch.setattr(cmsis_pack, '_FILE_CACHE_MAX_BYTES', 32)
+        p = cmsis_pack.CmsisPack(buf)
+        for name in ("Device.svd", "Small.FLM", "Large.FLM"):
+            assert p.get_file(name).read()
+        # Neither the SVD nor the file larger than the byte limit is cached.
+        assert list(p._file_cache) == ["Small.FLM"]
+
+    def test_flash_algo_cached(self, k64f1m0):
+        algo = k64f1m0._load_flash_algo(K64F_1M0_FLM)
+        assert algo is not None
+        assert k64f1m0._load_flash_algo(K64F_1M0_FLM.replace('/', '\\')) is algo
+
     def test_get_svd(self, k64f1m0):
         svd = k64f1m0.svd
         x = ElementTree.parse(svd)
@@ -196,6 +263,152 @@ class TestFLM(object):
         buf2 = buf1 + k64algo.page_size
         assert d['page_buffers'] == [buf1, buf2]
 
+OVERLAP_PDSC = b"""<?xml version="1.0" encoding="UTF-8"?>
+<package>
+  <devices>
+    <family Dfamily="TestFamily" Dvendor="Test:0">
+      <memory name="FLASH" access="rx" start="0x0" size="0x10000" default="1" startup="1"/>
+      <memory name="SRAM" access="rwx" start="0x20000000" size="0x8000" default="1"/>
+      <device Dname="TestDevice1">
+        <memory name="SRAM_INNER" access="rwx" start="0x20004000" size="0x1000" default="1"/>
+      </device>
+      <device Dname="TestDevice2"/>
+    </family>
+  </devices>
+</package>
+"""
+
+NESTED_PDSC = b"""<?xml version="1.0" encoding="UTF-8"?>
+<package>
+  <devices>
+    <family Dfamily="TestFamily" Dvendor="Test:0">
+      <memory name="SRAM_L" access="rwx" start="0x20000000" size="0x1000"/>
+      <device Dname="TestDevice">
+        <memory name="RAM" access="rwx" start="0x1fff0000" size="0x20000" default="1"/>
+      </device>
+    </family>
+  </devices>
+</package>
+"""
+
+TRUNCATED_PDSC = b"""<?xml version="1.0" encoding="UTF-8"?>
+<package>
+  <devices>
+    <family Dfamily="TestFamily" Dvendor="Test:0">
+      <device Dname="D1"/>
+      <device Dname="D2"/>
+    </family>
+    <family Dfamily="TestFamily2" Dvendor="Test:0">
+      <device Dname="D3"
+"""
+
+# The external entity is referenced from element text, since expat and libxml2 both reject
+# references to external entities in attribute values.
+EXTERNAL_ENTITY_PDSC = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE package [<!ENTITY secret SYSTEM "{url}">]>
+<package>
+  <devices>
+    <family Dfamily="TestFamily" Dvendor="Test:0">
+      <device Dname="TestDevice">
+        <description>&secret;</description>
+      </device>
+    </family>
+  </devices>
+</package>
+"""
+
+class TestMalformedPdsc():
+    @pytest.mark.parametrize("use_lxml", [
+            False,
+            pytest.param(True, marks=pytest.mark.skipif(not cmsis_pack.LXML_AVAILABLE, reason="lxml is not installed")),
+        ])
+    def test_parse_error(self, monkeypatch, use_lxml):
+        monkeypatch.setattr(cmsis_pack, '_USE_LXML', use_lxml)
+        pdsc = cmsis_pack.CmsisPackDescription(None, io.BytesIO(TRUNCATED_PDSC))
+        for _ in range(2):
+            with pytest.raises(cmsis_pack.MalformedCmsisPackError):
+                pdsc.devices
+            # Devices created before the error must not be kept.
+            assert pdsc._devices == []
+
+    @pytest.mark.parametrize("use_lxml", [
+            False,
+            pytest.param(True, marks=pytest.mark.skipif(not cmsis_pack.LXML_AVAILABLE, reason="lxml is not installed")),
+        ])
+    def test_external_entity_not_expanded(self, monkeypatch, tmp_path, use_lxml):
+        monkeypatch.setattr(cmsis_pack, '_USE_LXML', use_lxml)
+        secret_path = tmp_path / "secret.txt"
+        secret_path.write_text("SECRET")
+        data = EXTERNAL_ENTITY_PDSC.format(url=secret_path.as_uri()).encode()
+        pdsc = cmsis_pack.CmsisPackDescription(None, io.BytesIO(data))
+        try:
+            devices = pdsc.devices
+        except cmsis_pack.MalformedCmsisPackError:
+            return
+        for elem in devices[0]._info.element.iter():
+            assert "SECRET" not in (elem.text or "")
+            assert all("SECRET" not in v for v in elem.attrib.values())
+
+class TestMemoryFilter():
+    def test_inner_overlap_replaces_outer(self):
+        pdsc = cmsis_pack.CmsisPackDescription(None, io.BytesIO(OVERLAP_PDSC))
+        devs = {d.part_number: d for d in pdsc.devices}
+        names1 = [e.attrib['name'] for e in devs["TestDevice1"]._info.memories]
+        names2 = [e.attrib['name'] for e in devs["TestDevice2"]._info.memories]
+        assert names1 == ["FLASH", "SRAM_INNER"]
+        assert names2 == ["FLASH", "SRAM"]
+
+    def test_containing_region(self):
+        pdsc = cmsis_pack.CmsisPackDescription(None, io.BytesIO(OVERLAP_PDSC))
+        dev = [d for d in pdsc.devices if d.part_number == "TestDevice2"].pop()
+        dev._build_memory_regions()
+        assert dev._get_containing_region(0x0).name == "FLASH"
+        assert dev._get_containing_region(0xffff).name == "FLASH"
+        assert dev._get_containing_region(0x20007fff).name == "SRAM"
+        assert dev._get_containing_region(0x10000) is None
+        assert dev._get_containing_region(0x20008000) is None
+
+        # An inner region that fully contains an outer region is not filtered out.
+        pdsc = cmsis_pack.CmsisPackDescription(None, io.BytesIO(NESTED_PDSC))
+        dev = pdsc.devices[0]
+        dev._build_memory_regions()
+        assert [r.name for r in dev._regions] == ["SRAM_L", "RAM"]
+        assert dev._get_containing_region(0x20008000).name == "RAM"
+        assert dev._get_containing_region(0x20000800).name == "SRAM_L"
+        assert dev._get_containing_region(0x20010000) is None
+
+ALGO_PDSC = b"""<?xml version="1.0" encoding="UTF-8"?>
+<package>
+  <devices>
+    <family Dfamily="TestFamily" Dvendor="Test:0">
+      <device Dname="TestDevice">
+        <algorithm name="Flash/WHOLE.FLM" start="0x0" size="0x20000" default="1"/>
+        <algorithm name="Flash/BANK2.FLM" start="0x10000" size="0x8000"/>
+        <algorithm name="Flash/EMPTY.FLM" start="0x30000" size="0"/>
+      </device>
+    </family>
+  </devices>
+</package>
+"""
+
+class TestFindAlgo():
+    @pytest.mark.parametrize(("start", "length", "expected"), [
+            (0x0, 0x20000, "Flash/WHOLE.FLM"),
+            (0x10000, 0x8000, "Flash/WHOLE.FLM"),
+            (0x18000, 0x8000, "Flash/WHOLE.FLM"),
+            (0x18000, 0x10000, None),
+            (0x30000, 0x1000, None),
+        ])
+    def test_find_matching_algo(self, start, length, expected):
+        pdsc = cmsis_pack.CmsisPackDescription(None, io.BytesIO(ALGO_PDSC))
+        dev = pdsc.devices[0]
+        region = memory_map.RomRegion(start=start, length=length)
+        if expected is None:
+            with pytest.raises(KeyError):
+                dev._find_matching_algo(region)
+        else:
+            assert dev._find_matching_algo(region).attrib['name'] == expected
+
 def has_overlapping_regions(memmap):
     return any((len(memmap.get_intersecting_regions(r.start, r.end)) > 1) for r in memmap.regions)
 